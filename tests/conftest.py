@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# The script imports its sibling _markup module, so the repo root must be
+# importable however pytest is invoked (pytest, python -m pytest, any cwd)
+_ROOT = Path(__file__).resolve().parent.parent
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
@@ -0,0 +1,98 @@
+"""
+convert_markup_to_html must produce exactly what the original regex pipeline
+produced. The golden cases pin the subtle pairing / collapsing rules; the
+randomized test compares against that pipeline, kept here as the reference.
+"""
+
+import importlib.util
+import random
+import re
+from html import escape
+from pathlib import Path
+
+import pytest
+
+_SCRIPT = Path(__file__).resolve().parent.parent / "xlsx-to-moodle.py"
+_spec = importlib.util.spec_from_file_location("xlsx_to_moodle", _SCRIPT)
+converter = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(converter)
+
+
+def reference_markup_to_html(text):
+    """The regex-based converter the scanner replaced."""
+    if text is None:
+        return ""
+    t = re.sub(r"[\x00-\x08\x0B\x0C\x0E-\x1F]", "", str(text))
+    t = t.replace("\r\n", "\n").replace("\r", "\n").replace("[br]", "\n")
+    t = escape(t)
+    t = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", t)
+    t = re.sub(r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)", r"<em>\1</em>", t)
+
+    lines = t.split("\n")
+    html_lines = []
+    i = 0
+    while i < len(lines):
+        for pattern, tag in ((r"^\s*-\s+", "ul"), (r"^\s*\d+[\.\)]\s+", "ol")):
+            if re.match(pattern, lines[i]):
+                items = []
+                while i < len(lines) and re.match(pattern, lines[i]):
+                    items.append(re.sub(pattern, "", lines[i]).strip())
+                    i += 1
+                html_lines.append(f"<{tag}>" + "".join(f"<li>{itm}</li>" for itm in items) + f"</{tag}>")
+                break
+        else:
+            html_lines.append(lines[i])
+            i += 1
+
+    return re.sub(r"(?:<br/>\s*){3,}", "<br/><br/>", "<br/>".join(html_lines))
+
+
+# Outputs as the regex pipeline produced them, malformed nesting included
+GOLDEN = [
+    ("", ""),
+    ("plain & <text> \"quoted\" 'single'", "plain &amp; &lt;text&gt; &quot;quoted&quot; &#x27;single&#x27;"),
+    # bold / italic pairing
+    ("**bold** and *italic*", "<strong>bold</strong> and <em>italic</em>"),
+    ("*a **b***", "<em>a <strong>b</strong></em>"),
+    ("***a***", "<strong><em>a</strong></em>"),
+    ("***", "***"),
+    ("****", "****"),
+    ("**a *b** c*", "<strong>a <em>b</strong> c</em>"),
+    ("**unclosed", "**unclosed"),
+    ("*a*b*c*", "<em>a</em>b<em>c</em>"),
+    ("2 * 3 * 4", "2 <em> 3 </em> 4"),
+    # lists
+    ("- one\n- *two*\n1. a & b\n2) c",
+     "<ul><li>one</li><li><em>two</em></li></ul><br/><ol><li>a &amp; b</li><li>c</li></ol>"),
+    ("  -\tindented\n10. ten\n3.no space", "<ul><li>indented</li></ul><br/><ol><li>ten</li></ol><br/>3.no space"),
+    ("- ", "<ul><li></li></ul>"),
+    # line breaks and <br/> collapse
+    ("line\r\nnext\rlast", "line<br/>next<br/>last"),
+    ("x[br][br][br]y", "x<br/><br/>y"),
+    ("a\n\nb", "a<br/><br/>b"),
+    ("a\n\n\nb", "a<br/><br/>b"),
+    ("a\n \n\t\n   b", "a<br/><br/>b"),
+    ("  \n\n\n\nx", "  <br/><br/>x"),
+    ("a\n\n\n", "a<br/><br/>"),
+    # control characters
+    ("ctrl\x01\x0bchars\tkept", "ctrlchars\tkept"),
+]
+
+
+@pytest.mark.parametrize("text, expected", GOLDEN)
+def test_golden(text, expected):
+    assert converter.convert_markup_to_html(text) == expected
+    assert reference_markup_to_html(text) == expected
+
+
+def test_none_is_empty():
+    assert converter.convert_markup_to_html(None) == ""
+
+
+def test_matches_reference_on_random_markup():
+    alphabet = ["*", "**", "a", "b", " ", "\n", "- ", "-", "1. ", "2) ", "12.", "\t",
+                "<", ">", "&", '"', "'", "[br]", "\r\n", "\x01", "x y", "  ", "é"]
+    rng = random.Random(20250901)
+    for _ in range(20000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 14)))
+        assert converter.convert_markup_to_html(text) == reference_markup_to_html(text), repr(text)
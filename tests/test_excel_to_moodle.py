@@ -0,0 +1,150 @@
+"""
+End-to-end checks of the workbook reader and the XML writer: workbooks are
+built with openpyxl, converted with excel_to_moodle_xml and the output read back.
+"""
+
+import importlib.util
+import re
+import sys
+import zipfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import openpyxl
+import pytest
+
+_SCRIPT = Path(__file__).resolve().parent.parent / "xlsx-to-moodle.py"
+_spec = importlib.util.spec_from_file_location("xlsx_to_moodle", _SCRIPT)
+converter = importlib.util.module_from_spec(_spec)
+# Registered so the worker processes of the jobs > 1 path can unpickle its functions
+sys.modules[_spec.name] = converter
+_spec.loader.exec_module(converter)
+
+HEADER = (["Name", "Question"] + [f"Choice{i}" for i in range(1, 6)]
+          + [f"Fraction{i}" for i in range(1, 6)] + ["GeneralFeedback"])
+
+
+def question_row(name, question, correct=1):
+    fractions = [100 if i == correct else 0 for i in range(1, 6)]
+    return [name, question] + [f"{question} {c}" for c in "abcde"] + fractions + ["feedback"]
+
+
+def make_workbook(path, rows, header=HEADER, extra_sheet=False):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Questions"
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    if extra_sheet:
+        other = wb.create_sheet("Notes")
+        other.append(["not", "a", "question", "sheet"])
+        wb.active = 1
+    wb.save(path)
+    return path
+
+
+def convert(tmp_path, in_path, jobs=1, name="out.xml"):
+    out_path = tmp_path / name
+    converter.excel_to_moodle_xml(in_path, out_path, "Tests", jobs)
+    return out_path
+
+
+def questions(out_path):
+    root = ET.parse(out_path).getroot()
+    return [q for q in root.iter("question") if q.get("type") == "multichoice"]
+
+
+def names(out_path):
+    return [q.findtext("name/text") for q in questions(out_path)]
+
+
+def test_basic_conversion(tmp_path):
+    path = make_workbook(tmp_path / "in.xlsx", [question_row("First", "What is **1**?", correct=2)])
+    out = convert(tmp_path, path)
+    root = ET.parse(out).getroot()
+    assert root.tag == "quiz"
+    assert root.find("question[@type='category']/category/text").text == "$course$/Tests"
+
+    (q,) = questions(out)
+    assert q.findtext("name/text") == "First"
+    assert q.findtext("questiontext/text") == "What is <strong>1</strong>?"
+    assert q.findtext("single") == "true"
+    assert q.findtext("shuffleanswers") == "true"
+    assert q.findtext("defaultgrade") == "5.00"
+    assert [a.get("fraction") for a in q.findall("answer")] == ["0.0", "100.0", "0.0", "0.0", "0.0"]
+    answers = [a.findtext("text") for a in q.findall("answer")]
+    assert answers[:2] == ["What is <strong>1</strong>? a", "What is <strong>1</strong>? b"]
+
+
+def test_reads_first_sheet_not_active(tmp_path):
+    path = make_workbook(tmp_path / "in.xlsx", [question_row("Only", "Q")], extra_sheet=True)
+    assert names(convert(tmp_path, path)) == ["Only"]
+
+
+def test_blank_rows_are_skipped(tmp_path):
+    rows = [question_row(None, "one"), [None] * len(HEADER), question_row(None, "two")]
+    path = make_workbook(tmp_path / "in.xlsx", rows)
+    out = convert(tmp_path, path)
+    # The blank row yields no question, so the fallback names stay consecutive
+    assert names(out) == ["Q1", "Q2"]
+    assert [q.findtext("questiontext/text") for q in questions(out)] == ["one", "two"]
+
+
+def test_empty_cells_become_empty_text(tmp_path):
+    row = question_row("Q", "stem")
+    row[HEADER.index("GeneralFeedback")] = None
+    row[HEADER.index("Choice5")] = None
+    path = make_workbook(tmp_path / "in.xlsx", [row])
+    (q,) = questions(convert(tmp_path, path))
+    assert q.findtext("generalfeedback/text") == ""
+    assert q.findall("answer")[-1].findtext("text") == ""
+
+
+def test_header_normalization(tmp_path):
+    header = (["name", " QUESTION "] + [f"choice {i}" for i in range(1, 6)]
+              + [f"Fraction_{i}" for i in range(1, 6)] + ["general-feedback", "Default Grade", "shuffle"])
+    row = question_row("Normalized", "stem") + [2, "no"]
+    path = make_workbook(tmp_path / "in.xlsx", [row], header=header)
+    (q,) = questions(convert(tmp_path, path))
+    assert q.findtext("name/text") == "Normalized"
+    assert q.findtext("questiontext/text") == "stem"
+    assert q.findtext("generalfeedback/text") == "feedback"
+    assert q.findtext("defaultgrade") == "2.00"
+    assert q.findtext("shuffleanswers") == "false"
+
+
+def test_missing_required_columns(tmp_path):
+    path = make_workbook(tmp_path / "in.xlsx", [question_row("Q", "stem")], header=HEADER[:-3])
+    with pytest.raises(ValueError, match="missing required columns: Fraction4, Fraction5"):
+        convert(tmp_path, path)
+    assert not (tmp_path / "out.xml").exists()
+
+
+def test_jobs_output_is_identical(tmp_path, monkeypatch):
+    # Small chunks so the pool receives several frames
+    monkeypatch.setattr(converter, "_CHUNK_ROWS", 3)
+    rows = [question_row(None if k % 4 else f"N{k}", f"*q* {k}\n- item", correct=k % 5 + 1) for k in range(20)]
+    path = make_workbook(tmp_path / "in.xlsx", rows)
+    serial = convert(tmp_path, path, jobs=1, name="serial.xml")
+    parallel = convert(tmp_path, path, jobs=2, name="parallel.xml")
+    assert serial.read_bytes() == parallel.read_bytes()
+    assert len(questions(serial)) == 20
+    assert names(serial)[:3] == ["N0", "Q2", "Q3"]
+
+
+def test_stale_dimension_record(tmp_path):
+    good = make_workbook(tmp_path / "good.xlsx", [question_row("A", "one"), question_row("B", "two")])
+    stale = tmp_path / "stale.xlsx"
+    # Rewrite the sheet's <dimension> as some non-Excel writers leave it
+    with zipfile.ZipFile(good) as src, zipfile.ZipFile(stale, "w") as dst:
+        for item in src.infolist():
+            data = src.read(item)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data, n = re.subn(rb'<dimension ref="[^"]*"\s*/>', b'<dimension ref="A1"/>', data)
+                assert n == 1
+            dst.writestr(item, data)
+
+    expected = convert(tmp_path, good, name="good.xml").read_bytes()
+    assert convert(tmp_path, stale, name="stale.xml").read_bytes() == expected
+    assert names(tmp_path / "stale.xml") == ["A", "B"]
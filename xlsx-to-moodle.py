@@ -7,26 +7,35 @@ Excel → Moodle XML (MCQ) converter
 - Question text supports: **bold**, *italic*, bullet (- ) and numbered lists (1. / 1) ), line breaks [br] or \n
 
 Usage:
-    python convert.py --in input.xlsx --out output.xml --category "Sample Category"
+    python convert.py --in input.xlsx --out output.xml --category "Sample Category" [--jobs N]
+
+Optional: compile the markup scanner for faster conversion with `mypyc _markup.py`.
 """
 
 import argparse
+import functools
+import itertools
 import re
 import sys
-from xml.etree.ElementTree import Element, SubElement, ElementTree
-from html import escape
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import openpyxl
 import pandas as pd
 from pathlib import Path
 
+from _markup import HTML_ESCAPE_TABLE, render_markup
+
 # ---------- Formatting helpers ----------
 
-_ctrl_re = re.compile(r"[\x00-\x08\x0B\x0C\x0E-\x1F]")
+# C0 control chars not allowed in XML 1.0 (tab, LF and CR are kept)
+_CTRL_DELETE = dict.fromkeys(list(range(0, 9)) + [11, 12] + list(range(14, 32)), None)
+_NORM_COL_RE = re.compile(r"[\s\-_]+")
 
 def strip_control(s: str) -> str:
-    if s is None:
-        return ""
-    return _ctrl_re.sub("", str(s))
+    return "" if s is None else str(s).translate(_CTRL_DELETE)
 
+# Pure function, and feedback / stem phrases tend to repeat across a question bank
+@functools.lru_cache(maxsize=4096)
 def convert_markup_to_html(text: str) -> str:
     """
     Convert lightweight markup in question text to HTML suitable for Moodle:
@@ -42,217 +51,278 @@ def convert_markup_to_html(text: str) -> str:
     t = strip_control(text).replace("\r\n", "\n").replace("\r", "\n")
     t = t.replace("[br]", "\n")
 
-    # Escape HTML first, then apply lightweight markup
-    t = escape(t)
-
-    # Bold (**...**)
-    t = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", t)
-    # Italic (*...*)
-    t = re.sub(r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)", r"<em>\1</em>", t)
-
-    # Lists
-    lines = t.split("\n")
-    html_lines = []
-    i = 0
-    while i < len(lines):
-        line = lines[i]
-
-        if re.match(r"^\s*-\s+", line):
-            items = []
-            while i < len(lines) and re.match(r"^\s*-\s+", lines[i]):
-                items.append(re.sub(r"^\s*-\s+", "", lines[i]).strip())
-                i += 1
-            html_lines.append("<ul>" + "".join(f"<li>{itm}</li>" for itm in items) + "</ul>")
-            continue
-
-        if re.match(r"^\s*\d+[\.\)]\s+", line):
-            items = []
-            while i < len(lines) and re.match(r"^\s*\d+[\.\)]\s+", lines[i]):
-                items.append(re.sub(r"^\s*\d+[\.\)]\s+", "", lines[i]).strip())
-                i += 1
-            html_lines.append("<ol>" + "".join(f"<li>{itm}</li>" for itm in items) + "</ol>")
-            continue
-
-        html_lines.append(line)
-        i += 1
-
-    html = "<br/>".join(html_lines)
-    html = re.sub(r"(?:<br/>\s*){3,}", "<br/><br/>", html)
-    return html
-
-def clean_float(x, default=None):
-    if x is None or (isinstance(x, float) and pd.isna(x)) or (isinstance(x, str) and x.strip() == ""):
-        return default
-    try:
-        return float(x)
-    except Exception:
-        return default
+    # Fast path: a single line that cannot hold markup or a list item only needs escaping
+    if "*" not in t and "\n" not in t:
+        head = t.lstrip()[:1]
+        if head != "-" and not head.isdecimal():
+            return t.translate(HTML_ESCAPE_TABLE)
+
+    return render_markup(t)
+
+# Accepted spellings of a boolean cell; bools / 0 / 1 resolve without building a string
+_BOOL_MAP = {
+    "true": True, "t": True, "1": True, "yes": True, "y": True,
+    "false": False, "f": False, "0": False, "no": False, "n": False,
+    True: True, False: False,
+}
 
 def clean_bool(x, default=True):
-    if isinstance(x, bool):
-        return x
+    v = _BOOL_MAP.get(x)
+    if v is not None:
+        return v
     if x is None or (isinstance(x, float) and pd.isna(x)):
         return default
-    s = str(x).strip().lower()
-    if s in {"true", "t", "1", "yes", "y"}:
-        return True
-    if s in {"false", "f", "0", "no", "n"}:
-        return False
-    return default
+    return _BOOL_MAP.get(str(x).strip().lower(), default)
 
 # ---------- XML helpers ----------
 
-def add_text_node(parent, tag, text, format="html"):
-    """Create Moodle <tag><text>..</text></tag> with format attr where supported."""
-    node = SubElement(parent, tag)
-    if tag in {"questiontext", "generalfeedback", "feedback"}:
-        node.set("format", format)
-    text_el = SubElement(node, "text")
-    text_el.text = "" if text is None else str(text)
-    return node
+_XML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+# Preformatted values for the fractions and default grades a bank normally uses
+_FRAC_STRS = {0.0: "0.0"}
+for _f in (5.0, 10.0, 12.5, 20.0, 25.0, 30.0, 33.33333, 40.0, 50.0,
+           60.0, 66.66667, 70.0, 75.0, 80.0, 90.0, 100.0):
+    _FRAC_STRS[_f] = str(_f)
+    _FRAC_STRS[-_f] = str(-_f)
+_GRADE_STRS = {v: f"{v:.2f}" for v in (0.0, 0.5, 1.0, 2.0, 3.0, 4.0, 5.0, 10.0)}
+
+def _cdata(html: str) -> str:
+    """Wrap HTML in a CDATA section so its markup is not escaped a second time."""
+    if not html:
+        return ""
+    return "<![CDATA[" + html.replace("]]>", "]]]]><![CDATA[>") + "]]>"
+
+# Fixed layout of a multichoice question; HTML payloads are filled in via _cdata.
+# Penalty stays 0 (fraction for adaptive mode), answers are numbered A, B, C, …
+_QUESTION_TEMPLATE = (
+    '<question type="multichoice">\n'
+    '<name><text>{name}</text></name>\n'
+    '<questiontext format="html"><text>{qtext}</text></questiontext>\n'
+    '<defaultgrade>{grade}</defaultgrade>\n'
+    '<penalty>0.0</penalty>\n'
+    '<single>{single}</single>\n'
+    '<shuffleanswers>{shuffle}</shuffleanswers>\n'
+    '<answernumbering>ABCD</answernumbering>\n'
+    '<generalfeedback format="html"><text>{gf}</text></generalfeedback>\n'
+    '{answers}'
+    '</question>\n'
+)
+_ANSWER_TEMPLATE = (
+    '<answer fraction="{frac}" format="html"><text>{text}</text>'
+    '<feedback format="html"><text>{fb}</text></feedback></answer>\n'
+)
 
 def question_multichoice_xml(qrow, index, category_name):
     """
-    Build a <question type="multichoice"> node from a DataFrame row.
-    Required cols: Question, Choice1..5, Fraction1..5
-    Optional: Name, GeneralFeedback, ChoiceFeedback1..5, DefaultGrade, Shuffle
+    Build the <question type="multichoice"> XML from a row tuple of a frame
+    prepared by clean_columns (all columns present, values already cleaned).
     """
-    q = Element("question", {"type": "multichoice"})
-
-    # Name
-    name_val = qrow.get("Name")
-    if not name_val or (isinstance(name_val, float) and pd.isna(name_val)):
-        name_val = f"Q{index+1}"
-    name = SubElement(q, "name")
-    SubElement(name, "text").text = str(strip_control(name_val))
-
-    # Question text (HTML)
-    qtext_html = convert_markup_to_html(str(qrow.get("Question", "")).strip())
-    qt = SubElement(q, "questiontext", {"format": "html"})
-    SubElement(qt, "text").text = str(qtext_html)
-
-    # Default grade
-    defaultgrade = clean_float(qrow.get("DefaultGrade"), default=5.0)
-    SubElement(q, "defaultgrade").text = f"{defaultgrade:.2f}"
-
-    # Penalty (fraction for adaptive; keep default 0)
-    SubElement(q, "penalty").text = "0.0"
-
     # Single: if exactly one answer has the maximum fraction (>= 100 - tiny epsilon)
-    fractions = [clean_float(qrow.get(f"Fraction{i}"), default=0.0) for i in range(1, 6)]
+    fractions = [getattr(qrow, f"Fraction{i}") for i in range(1, 6)]
     max_frac = max(fractions) if fractions else 0.0
     single = fractions.count(max_frac) == 1 and max_frac >= 100.0 - 1e-6
-    SubElement(q, "single").text = "true" if single else "false"
-
-    # Shuffle answers
-    shuffle = clean_bool(qrow.get("Shuffle"), default=True)
-    SubElement(q, "shuffleanswers").text = "true" if shuffle else "false"
-
-    # Answer numbering (a,b,c,…)
-    SubElement(q, "answernumbering").text = "ABCD"
-
-    # General Feedback
-    gf = qrow.get("GeneralFeedback")
-    gf_html = convert_markup_to_html(strip_control(gf))
-    gfnode = SubElement(q, "generalfeedback", {"format": "html"})
-    SubElement(gfnode, "text").text = str(gf_html)
-
-    # 5 Choices
-    for i in range(1, 6):
-        choice_text = qrow.get(f"Choice{i}")
-        choice_html = convert_markup_to_html(strip_control(choice_text))
-
-        frac = clean_float(qrow.get(f"Fraction{i}"), default=0.0)
-        if frac is None:
-            frac = 0.0
-        frac = max(-100.0, min(100.0, float(frac)))
-
-        ans = SubElement(q, "answer", {"fraction": str(frac), "format": "html"})
-        text_el = SubElement(ans, "text")
-        text_el.text = str(choice_html)
 
-        # per-choice feedback (optional)
-        cfb = qrow.get(f"ChoiceFeedback{i}")
-        cfb_html = convert_markup_to_html(strip_control(cfb))
+    # 5 Choices, each with its (optional) feedback; written fractions are clipped to [-100, 100]
+    clipped = [max(-100.0, min(100.0, frac)) for frac in fractions]
+    answers = "".join(
+        _ANSWER_TEMPLATE.format_map({
+            "frac": _FRAC_STRS.get(frac) or str(frac),
+            "text": _cdata(convert_markup_to_html(getattr(qrow, f"Choice{i}"))),
+            "fb": _cdata(convert_markup_to_html(getattr(qrow, f"ChoiceFeedback{i}"))),
+        })
+        for i, frac in enumerate(clipped, 1)
+    )
+
+    grade = qrow.DefaultGrade
+    return _QUESTION_TEMPLATE.format_map({
+        "name": (qrow.Name or f"Q{index+1}").translate(_XML_ESCAPE_TABLE),
+        "qtext": _cdata(convert_markup_to_html(qrow.Question.strip())),
+        "grade": _GRADE_STRS.get(grade) or f"{grade:.2f}",
+        "single": "true" if single else "false",
+        "shuffle": "true" if qrow.Shuffle else "false",
+        "gf": _cdata(convert_markup_to_html(qrow.GeneralFeedback)),
+        "answers": answers,
+    })
+
+# Normalized header -> pretty column name we expect
+_CANONICAL_COLUMNS = {
+    "name": "Name",
+    "question": "Question",
+    "generalfeedback": "GeneralFeedback",
+    "defaultgrade": "DefaultGrade",
+    "shuffle": "Shuffle",
+}
+for _i in range(1, 6):
+    _CANONICAL_COLUMNS[f"choice{_i}"] = f"Choice{_i}"
+    _CANONICAL_COLUMNS[f"fraction{_i}"] = f"Fraction{_i}"
+    _CANONICAL_COLUMNS[f"choicefeedback{_i}"] = f"ChoiceFeedback{_i}"
+
+_REQUIRED_COLUMNS = ["Question"] + [f"Choice{i}" for i in range(1, 6)] + [f"Fraction{i}" for i in range(1, 6)]
+
+def _normalize_headers(header) -> dict:
+    """
+    Map the pretty names of the known columns (in canonical order) to their
+    position in the header row. Headers are normalized (strip, lowercase,
+    drop spaces/underscores/dashes) so users can write 'choice 1' or
+    'Choice_1' etc.; the first matching header wins.
+    """
+    positions = {}
+    for j, c in enumerate(header):
+        if c is not None:
+            positions.setdefault(_NORM_COL_RE.sub("", str(c).strip().lower()), j)
+    col_idx = {pretty: positions[key] for key, pretty in _CANONICAL_COLUMNS.items() if key in positions}
 
-        fb = SubElement(ans, "feedback", {"format": "html"})
-        fb_text = SubElement(fb, "text")
-        fb_text.text = str(cfb_html)
+    # Ensure required columns exist; if not, raise a clear error
+    missing = [c for c in _REQUIRED_COLUMNS if c not in col_idx]
+    if missing:
+        raise ValueError(f"Your Excel is missing required columns: {', '.join(missing)}")
 
-    return q   # ✅ FIX: return the <question> node
+    return col_idx
 
-def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+def clean_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Normalize column names (strip, lowercase, replace spaces/underscores/dashes)
-    so users can write 'choice 1' or 'Choice_1' etc.
+    Clean whole columns at once so the per-question code only reads values:
+    text columns become str ("" when empty, and for a falsy Name such as 0,
+    so it falls back to Q{n}), fractions floats, DefaultGrade a float and
+    Shuffle a bool. Only Name is control-stripped here; the HTML columns are
+    cleaned by convert_markup_to_html.
+    Missing optional columns are added with their defaults.
     """
-    mapping = {}
-    for c in df.columns:
-        key = re.sub(r"[\s\-_]+", "", str(c).strip().lower())
-        mapping[c] = key
-    df2 = df.rename(columns=mapping)
-
-    # Build reverse map to pretty keys we expect
-    canonical = {
-        "name": "Name",
-        "question": "Question",
-        "generalfeedback": "GeneralFeedback",
-        "defaultgrade": "DefaultGrade",
-        "shuffle": "Shuffle",
-    }
-    for i in range(1, 6):
-        canonical[f"choice{i}"] = f"Choice{i}"
-        canonical[f"fraction{i}"] = f"Fraction{i}"
-        canonical[f"choicefeedback{i}"] = f"ChoiceFeedback{i}"
-
-    out = {}
-    for key, pretty in canonical.items():
-        if key in df2.columns:
-            out[pretty] = df2[key]
+    text_cols = (["Name", "Question", "GeneralFeedback"]
+                 + [f"Choice{i}" for i in range(1, 6)]
+                 + [f"ChoiceFeedback{i}" for i in range(1, 6)])
+    for col in text_cols:
+        if col in df.columns:
+            values = df[col].fillna("")
+            if col == "Name":
+                df[col] = values.where(values.astype(bool), "").astype(str).map(strip_control)
+            else:
+                df[col] = values.astype(str)
         else:
-            out[pretty] = None
+            df[col] = ""
 
-    # Re-assemble into a new uniform frame
-    new_df = pd.DataFrame({k: out[k] for k in canonical.values() if out[k] is not None})
+    for i in range(1, 6):
+        col = f"Fraction{i}"
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype(float).fillna(0.0)
 
-    # Ensure required columns exist; if not, raise a clear error
-    required = ["Question"] + [f"Choice{i}" for i in range(1, 6)] + [f"Fraction{i}" for i in range(1, 6)]
-    missing = [c for c in required if c not in new_df.columns]
-    if missing:
-        raise ValueError(f"Your Excel is missing required columns: {', '.join(missing)}")
+    if "DefaultGrade" in df.columns:
+        df["DefaultGrade"] = pd.to_numeric(df["DefaultGrade"], errors="coerce").astype(float).fillna(5.0)
+    else:
+        df["DefaultGrade"] = 5.0
 
-    return new_df
+    if "Shuffle" in df.columns:
+        df["Shuffle"] = df["Shuffle"].map(clean_bool)
+    else:
+        df["Shuffle"] = True
 
-def build_quiz_root():
-    return Element("quiz")
+    return df
 
-def add_category(root, category_name: str):
-    q = SubElement(root, "question", {"type": "category"})
+def category_xml(category_name: str):
+    """Build the <question type="category"> XML that opens the quiz."""
     cattext = f"$course$/{category_name}" if category_name else "$course$/Default"
-    category = SubElement(q, "category")
-    SubElement(category, "text").text = cattext
+    return f'<question type="category"><category><text>{cattext.translate(_XML_ESCAPE_TABLE)}</text></category></question>'
 
-def excel_to_moodle_xml(in_path: Path, out_path: Path, category: str):
-    df = pd.read_excel(in_path)
-    df = normalize_columns(df)
-    root = build_quiz_root()
-    add_category(root, category)
+# Questions per frame: bounds memory and is the unit of work handed to a worker
+_CHUNK_ROWS = 500
 
-    for idx, row in df.iterrows():
-        qnode = question_multichoice_xml(row, idx, category)
-        root.append(qnode)
-
-    tree = ElementTree(root)
+def iter_question_frames(in_path: Path, chunk_rows: int):
+    """
+    Stream the first sheet of in_path as cleaned frames of up to chunk_rows
+    questions each. The workbook is read row by row in read-only mode, so
+    memory stays proportional to chunk_rows; fully blank rows are skipped.
+    """
+    wb = openpyxl.load_workbook(in_path, read_only=True, data_only=True)
+    try:
+        # First sheet, as pd.read_excel did -- not whichever one was last selected
+        ws = wb.worksheets[0]
+        # Read-only mode trusts the sheet's <dimension> record, which some tools
+        # write wrong or leave stale; like pd.read_excel, scan the real extent
+        ws.reset_dimensions()
+        rows = ws.iter_rows(values_only=True)
+        col_idx = _normalize_headers(next(rows, ()))
+        names = list(col_idx)
+        positions = list(col_idx.values())
+
+        batch = []
+        for row in rows:
+            if all(v is None for v in row):
+                continue
+            batch.append([row[j] if j < len(row) else None for j in positions])
+            if len(batch) == chunk_rows:
+                yield clean_columns(pd.DataFrame(batch, columns=names, dtype=object))
+                batch = []
+        if batch:
+            yield clean_columns(pd.DataFrame(batch, columns=names, dtype=object))
+    finally:
+        wb.close()
+
+def _render_chunk_into(buf: bytearray, frame: pd.DataFrame, start_idx: int, category: str) -> None:
+    """Append the UTF-8 XML of a cleaned frame, whose first row is question start_idx, to buf."""
+    for k, row in enumerate(frame.itertuples(index=False, name="Row")):
+        buf += question_multichoice_xml(row, start_idx + k, category).encode("utf-8")
+
+def _render_chunk(frame: pd.DataFrame, start_idx: int, category: str) -> bytearray:
+    """Worker entry point: render a cleaned frame into a fresh buffer."""
+    buf = bytearray()
+    _render_chunk_into(buf, frame, start_idx, category)
+    return buf
+
+def _write_questions(fh, frames, category: str, jobs: int) -> None:
+    """
+    Render frames in order and write them to fh. With jobs > 1 and more than
+    one frame, frames are rendered by worker processes; only a bounded number
+    are in flight at once so the input keeps streaming.
+    """
+    start = 0
+    if jobs > 1:
+        frames = iter(frames)
+        head = list(itertools.islice(frames, 2))
+        if len(head) < 2:
+            frames = head
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                pending = deque()
+                for frame in itertools.chain(head, frames):
+                    pending.append(pool.submit(_render_chunk, frame, start, category))
+                    start += len(frame)
+                    if len(pending) >= 2 * jobs:
+                        fh.write(pending.popleft().result())
+                while pending:
+                    fh.write(pending.popleft().result())
+            return
+
+    # In-process: one buffer, flushed and reused for every frame
+    buf = bytearray()
+    for frame in frames:
+        _render_chunk_into(buf, frame, start, category)
+        fh.write(buf)
+        buf.clear()
+        start += len(frame)
+
+def excel_to_moodle_xml(in_path: Path, out_path: Path, category: str, jobs: int = 1):
+    frames = iter_question_frames(in_path, _CHUNK_ROWS)
+    # Pull the header first so a bad sheet fails before the output is created
+    first = next(frames, None)
+
+    # Stream rows in and the <quiz> out chunk by chunk, rendering chunks in parallel
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    tree.write(out_path, encoding="utf-8", xml_declaration=True)
+    with open(out_path, "wb") as fh:
+        fh.write(b'<?xml version="1.0" encoding="utf-8"?>\n<quiz>\n')
+        fh.write(category_xml(category).encode("utf-8") + b"\n")
+        if first is not None:
+            _write_questions(fh, itertools.chain((first,), frames), category, jobs)
+        fh.write(b"</quiz>\n")
     print(f"✅ Wrote Moodle XML: {out_path}")
 
 def main():
     ap = argparse.ArgumentParser(description="Convert Excel to Moodle XML (MCQ, 5 choices).")
-    ap.add_argument("--in", dest="infile", required=True, help="Input Excel file (.xlsx)")
+    ap.add_argument("--in", dest="infile", required=True, help="Input Excel file (.xlsx / .xlsm)")
     ap.add_argument("--out", dest="outfile", required=True, help="Output Moodle XML file (.xml)")
     ap.add_argument("--category", dest="category", default="Imported from Excel",
                     help="Moodle category path under $course$ (default: 'Imported from Excel')")
+    ap.add_argument("--jobs", dest="jobs", type=int, default=1,
+                    help="Worker processes used to render questions (default: 1). Only rendering "
+                         "runs in parallel, so this mainly pays off for large, markup-heavy banks")
     args = ap.parse_args()
 
     in_path = Path(args.infile)
@@ -263,7 +333,7 @@ def main():
         sys.exit(1)
 
     try:
-        excel_to_moodle_xml(in_path, out_path, args.category)
+        excel_to_moodle_xml(in_path, out_path, args.category, args.jobs)
     except Exception as e:
         print(f"ERROR: {e}", file=sys.stderr)
         sys.exit(2)